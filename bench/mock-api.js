@@ -0,0 +1,165 @@
+const http = require('http');
+
+function createDataset(size) {
+  const months = ['january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december'];
+  const baseTime = Date.UTC(2025, 0, 1);
+
+  return Array.from({ length: size }, (_, index) => {
+    const id = 100000 + index;
+    const login = `student${index}`;
+    return {
+      id,
+      begin_at: new Date(baseTime - (index % 900) * 86400000).toISOString(),
+      end_at: null,
+      grade: index % 5 === 0 ? 'Member' : 'Learner',
+      level: 4 + ((index * 7919) % 2600) / 100,
+      skills: [
+        { id: 1, name: 'Algorithms & AI', level: (index % 17) / 2 },
+        { id: 2, name: 'Unix', level: (index % 13) / 2 }
+      ],
+      cursus_id: 21,
+      has_coalition: true,
+      blackholed_at: index % 7 === 0 ? null : new Date(baseTime + (index % 400) * 86400000).toISOString(),
+      created_at: new Date(baseTime - 86400000 * 1000).toISOString(),
+      updated_at: new Date(baseTime + index * 60000).toISOString(),
+      user: {
+        id: 200000 + index,
+        email: `${login}@student.42singapore.sg`,
+        login,
+        first_name: 'Student',
+        last_name: `Number${index}`,
+        usual_full_name: index % 3 === 0 ? `Student ${index}` : null,
+        url: `https://api.intra.42.fr/v2/users/${login}`,
+        phone: 'hidden',
+        displayname: `Student Number${index}`,
+        kind: 'student',
+        image: {
+          link: `https://cdn.intra.42.fr/users/${login}.jpg`,
+          versions: {
+            large: `https://cdn.intra.42.fr/users/large_${login}.jpg`,
+            medium: `https://cdn.intra.42.fr/users/medium_${login}.jpg`,
+            small: `https://cdn.intra.42.fr/users/small_${login}.jpg`,
+            micro: `https://cdn.intra.42.fr/users/micro_${login}.jpg`
+          }
+        },
+        'staff?': false,
+        correction_point: index % 11,
+        pool_month: months[index % 12],
+        pool_year: String(2019 + (index % 7)),
+        location: null,
+        wallet: (index * 37) % 2000,
+        anonymize_date: new Date(baseTime + 86400000 * 1500).toISOString(),
+        data_erasure_date: null,
+        created_at: new Date(baseTime - 86400000 * 1000).toISOString(),
+        updated_at: new Date(baseTime + index * 60000).toISOString(),
+        alumnized_at: null,
+        'alumni?': index % 19 === 0,
+        'active?': index % 4 !== 0,
+        alumni: index % 19 === 0,
+        active: index % 4 !== 0
+      }
+    };
+  });
+}
+
+function selectRecords(records, params) {
+  let selected = records;
+
+  for (const [key, value] of params) {
+    const match = /^range\[(\w+)\]$/.exec(key);
+    if (!match) {
+      continue;
+    }
+    const [field] = match.slice(1);
+    const [min, max] = value.split(',');
+    const numeric = typeof (records[0] || {})[field] === 'number';
+    const low = numeric ? Number(min) : min;
+    const high = numeric ? Number(max) : max;
+    selected = selected.filter(record => record[field] >= low && record[field] <= high);
+  }
+
+  const sort = params.get('sort') || 'id';
+  const descending = sort.startsWith('-');
+  const field = descending ? sort.slice(1) : sort;
+  return [...selected].sort((a, b) => (descending ? b[field] - a[field] : a[field] - b[field]) || a.id - b.id);
+}
+
+function createMockApi(options = {}) {
+  const {
+    users = 3000,
+    latencyMs = 0,
+    maxPageSize = 100,
+    rateLimitEvery = 0,
+    retryAfter = 1,
+    errorEvery = 0
+  } = options;
+  const records = createDataset(users);
+  const stats = { requests: 0, rateLimited: 0, failed: 0, bytesSent: 0 };
+
+  const send = (res, status, body, headers = {}) => {
+    const payload = JSON.stringify(body);
+    stats.bytesSent += Buffer.byteLength(payload);
+    setTimeout(() => {
+      res.writeHead(status, { 'Content-Type': 'application/json', ...headers });
+      res.end(payload);
+    }, latencyMs);
+  };
+
+  const server = http.createServer((req, res) => {
+    const url = new URL(req.url, 'http://localhost');
+    stats.requests++;
+
+    if (rateLimitEvery > 0 && stats.requests % rateLimitEvery === 0) {
+      stats.rateLimited++;
+      send(res, 429, { error: 'Too Many Requests' }, { 'Retry-After': String(retryAfter) });
+      return;
+    }
+
+    if (errorEvery > 0 && stats.requests % errorEvery === 0) {
+      stats.failed++;
+      send(res, 503, { error: 'Service Unavailable' });
+      return;
+    }
+
+    if (req.method === 'POST' && url.pathname === '/oauth/token') {
+      req.resume();
+      send(res, 200, {
+        access_token: `bench-token-${stats.requests}`,
+        token_type: 'bearer',
+        expires_in: 7200,
+        created_at: Math.floor(Date.now() / 1000)
+      });
+      return;
+    }
+
+    if (req.method === 'GET' && /^\/v2\/cursus\/\d+\/cursus_users$/.test(url.pathname)) {
+      const selected = selectRecords(records, url.searchParams);
+      const perPage = Math.min(parseInt(url.searchParams.get('page[size]'), 10) || 30, maxPageSize);
+      const page = parseInt(url.searchParams.get('page[number]'), 10) || 1;
+      send(res, 200, selected.slice((page - 1) * perPage, page * perPage), {
+        'X-Total': String(selected.length),
+        'X-Per-Page': String(perPage),
+        'X-Page': String(page)
+      });
+      return;
+    }
+
+    send(res, 404, { error: 'Not Found' });
+  });
+
+  return {
+    stats,
+    listen(port = 0) {
+      return new Promise(resolve => {
+        server.listen(port, '127.0.0.1', () => resolve(`http://127.0.0.1:${server.address().port}`));
+      });
+    },
+    close() {
+      server.closeAllConnections();
+      return new Promise(resolve => server.close(resolve));
+    }
+  };
+}
+
+module.exports = { createMockApi };
@@ -0,0 +1,8 @@
+const fs = require('fs');
+
+process.on('exit', code => {
+  fs.writeFileSync(process.env.BENCH_REPORT_FILE, JSON.stringify({
+    exitCode: code,
+    maxRssKb: process.resourceUsage().maxRSS
+  }));
+});
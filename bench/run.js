@@ -0,0 +1,130 @@
+const { spawn } = require('child_process');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { createMockApi } = require('./mock-api');
+
+const SCRIPT = path.join(__dirname, '..', 'script.js');
+const REPORT_HOOK = path.join(__dirname, 'report-usage.js');
+
+function parseArgs(argv) {
+  const separator = argv.indexOf('--');
+  const own = separator === -1 ? argv : argv.slice(0, separator);
+  const options = {
+    users: 3000,
+    latency: 20,
+    maxPageSize: 100,
+    rateLimitEvery: 0,
+    retryAfter: 1,
+    errorEvery: 0,
+    ratePerSecond: 1000,
+    runs: 3,
+    verbose: false,
+    scriptArgs: separator === -1 ? [] : argv.slice(separator + 1)
+  };
+
+  for (let i = 0; i < own.length; i++) {
+    const name = own[i].replace(/^--/, '').replace(/-([a-z])/g, (_, c) => c.toUpperCase());
+    if (name === 'verbose') {
+      options.verbose = true;
+    } else if (name in options) {
+      options[name] = Number(own[++i]);
+    } else {
+      throw new Error(`Unknown option ${own[i]}`);
+    }
+  }
+
+  return options;
+}
+
+function runScript(baseUrl, options) {
+  const workDir = fs.mkdtempSync(path.join(os.tmpdir(), 'eval42-bench-'));
+  const reportFile = path.join(workDir, 'usage.json');
+  const env = {
+    ...process.env,
+    FORTYTWO_API_URL: baseUrl,
+    FORTYTWO_CLIENT_ID: 'bench',
+    FORTYTWO_CLIENT_SECRET: 'bench',
+    RATE_LIMIT_PER_SECOND: String(options.ratePerSecond),
+    RATE_LIMIT_PER_HOUR: String(options.ratePerSecond * 3600),
+    BENCH_REPORT_FILE: reportFile
+  };
+
+  return new Promise((resolve, reject) => {
+    const start = process.hrtime.bigint();
+    const child = spawn(process.execPath, ['--require', REPORT_HOOK, SCRIPT, ...options.scriptArgs], {
+      cwd: workDir,
+      env,
+      stdio: options.verbose ? 'inherit' : 'ignore'
+    });
+
+    child.on('error', reject);
+    child.on('exit', () => {
+      const elapsedMs = Number(process.hrtime.bigint() - start) / 1e6;
+      const usage = JSON.parse(fs.readFileSync(reportFile, 'utf8'));
+      const bytesWritten = fs.readdirSync(workDir)
+        .filter(name => name.startsWith('student_users'))
+        .reduce((sum, name) => sum + fs.statSync(path.join(workDir, name)).size, 0);
+
+      fs.rmSync(workDir, { recursive: true, force: true });
+      resolve({ elapsedMs, bytesWritten, ...usage });
+    });
+  });
+}
+
+function median(values) {
+  const sorted = [...values].sort((a, b) => a - b);
+  return sorted[Math.floor(sorted.length / 2)];
+}
+
+async function main() {
+  const options = parseArgs(process.argv.slice(2));
+  const results = [];
+
+  console.log(`Benchmarking script.js against a mock API with ${options.users} users, ` +
+    `${options.latency}ms latency, page size ${options.maxPageSize}` +
+    (options.rateLimitEvery ? `, 429 every ${options.rateLimitEvery} requests` : '') +
+    (options.errorEvery ? `, 503 every ${options.errorEvery} requests` : ''));
+
+  for (let run = 1; run <= options.runs; run++) {
+    const api = createMockApi({
+      users: options.users,
+      latencyMs: options.latency,
+      maxPageSize: options.maxPageSize,
+      rateLimitEvery: options.rateLimitEvery,
+      retryAfter: options.retryAfter,
+      errorEvery: options.errorEvery
+    });
+    const baseUrl = await api.listen();
+    const result = await runScript(baseUrl, options);
+    await api.close();
+
+    result.requests = api.stats.requests;
+    result.rateLimited = api.stats.rateLimited;
+    result.failed = api.stats.failed;
+    result.bytesDownloaded = api.stats.bytesSent;
+    results.push(result);
+
+    console.log(`Run ${run}: ${(result.elapsedMs / 1000).toFixed(2)}s, ` +
+      `${result.requests} requests (${(result.requests / (result.elapsedMs / 1000)).toFixed(1)} req/s, ` +
+      `${result.rateLimited} rate limited, ${result.failed} failed), peak RSS ${(result.maxRssKb / 1024).toFixed(1)} MB, ` +
+      `${(result.bytesDownloaded / 1024).toFixed(0)} KB downloaded, ` +
+      `${(result.bytesWritten / 1024).toFixed(0)} KB written, exit code ${result.exitCode}`);
+  }
+
+  const elapsedMs = median(results.map(result => result.elapsedMs));
+  const requests = median(results.map(result => result.requests));
+  console.log(`Median: ${(elapsedMs / 1000).toFixed(2)}s, ` +
+    `${(requests / (elapsedMs / 1000)).toFixed(1)} req/s, ` +
+    `peak RSS ${(median(results.map(result => result.maxRssKb)) / 1024).toFixed(1)} MB, ` +
+    `${(median(results.map(result => result.bytesWritten)) / 1024).toFixed(0)} KB written`);
+
+  if (results.some(result => result.exitCode !== 0)) {
+    process.exitCode = 1;
+  }
+}
+
+main().catch(error => {
+  console.error('Benchmark failed:', error.message);
+  process.exit(1);
+});
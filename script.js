@@ -1,54 +1,1073 @@
 require('dotenv').config();
 const axios = require('axios');
+const crypto = require('crypto');
 const fs = require('fs');
+const zlib = require('zlib');
+const http = require('http');
+const https = require('https');
+const path = require('path');
+const { once } = require('events');
+const { finished, pipeline } = require('stream/promises');
+const { performance } = require('perf_hooks');
 
 const CLIENT_ID = process.env.FORTYTWO_CLIENT_ID;
 const CLIENT_SECRET = process.env.FORTYTWO_CLIENT_SECRET;
-const BASE_URL = 'https://api.intra.42.fr';
+const BASE_URL = process.env.FORTYTWO_API_URL || 'https://api.intra.42.fr';
 const CAMPUS_ID = 64;
 const CURSUS_ID = 21;
-const NON_STAFF_FILE = 'student_users.json';
+const OUTPUT_BASENAME = 'student_users';
+const OUTPUT_FORMAT = argValue('--format') || (process.argv.includes('--ndjson') ? 'ndjson' : 'json');
+const VERSIONED_OUTPUT = process.argv.includes('--versioned');
+const OUTPUT_KEEP_VERSIONS = parseInt(process.env.OUTPUT_KEEP_VERSIONS, 10) || 10;
+const VERSION_TIMESTAMP_PATTERN = '\\d{4}-\\d{2}-\\d{2}T\\d{2}-\\d{2}-\\d{2}-\\d{3}Z';
+const SQLITE_FILE = argValue('--sqlite');
+const SNAPSHOT = process.argv.includes('--snapshot');
+const CHANGE_FEED = process.argv.includes('--changes');
+const CHANGES_FILE = 'student_users_changes.ndjson';
+const RECORD_HASHES_FILE = process.env.RECORD_HASHES_FILE || '.record_hashes.json';
+const RESTORE_SNAPSHOT = argValue('--restore-snapshot');
+const DAEMON = process.argv.includes('--daemon');
+const DAEMON_HOST = process.env.DAEMON_HOST || '127.0.0.1';
+const DAEMON_PORT = parseInt(process.env.DAEMON_PORT, 10) || 8042;
+const DAEMON_REFRESH_INTERVAL_MS = (parseInt(process.env.DAEMON_REFRESH_MINUTES, 10) || 10) * 60 * 1000;
+const DAEMON_FULL_REFRESH_EVERY = parseInt(process.env.DAEMON_FULL_REFRESH_EVERY, 10) || 12;
+const SNAPSHOT_DIR = process.env.SNAPSHOT_DIR || 'snapshots';
+const SNAPSHOT_FULL_EVERY = parseInt(process.env.SNAPSHOT_FULL_EVERY, 10) || 30;
+const PER_PAGE = 100;
+const SHARDED = process.argv.includes('--shard');
+const KEYSET = process.argv.includes('--keyset');
+const MAX_ID = 2147483647;
+const SHARD_MAX_PAGES = parseInt(process.env.SHARD_MAX_PAGES, 10) || 5;
+const FETCH_CONCURRENCY = parseInt(process.env.FETCH_CONCURRENCY, 10) || 2;
+const FETCH_MAX_CONCURRENCY = Math.max(
+  parseInt(process.env.FETCH_MAX_CONCURRENCY, 10) || 8, FETCH_CONCURRENCY);
+const LATENCY_TOLERANCE = 2;
+const PREFETCH_DEPTH = parseInt(process.env.PREFETCH_DEPTH, 10) || FETCH_MAX_CONCURRENCY;
+const CHECKPOINT_FILE = process.env.CHECKPOINT_FILE || '.export_checkpoint.ndjson';
+const CHECKPOINT_MAX_AGE_MS = (parseInt(process.env.CHECKPOINT_MAX_AGE_MINUTES, 10) || 60) * 60 * 1000;
+const BATCH_INDEX_FILE = 'batch_index.json';
+const BATCH_CONCURRENCY = parseInt(process.env.BATCH_CONCURRENCY, 10) || 2;
+const BATCH_JOBS_FILE = argValue('--batch');
+const DEFAULT_QUERY = { campusId: CAMPUS_ID, cursusId: CURSUS_ID, levelRange: [4, 30] };
+const SYNC_STATE_FILE = process.env.SYNC_STATE_FILE || '.sync_state.json';
+const INCREMENTAL = process.argv.includes('--incremental');
+const TOKEN_CACHE_FILE = process.env.TOKEN_CACHE_FILE || '.token_cache.json';
+const TOKEN_REFRESH_MARGIN_MS = 60 * 1000;
+const HTTP_MAX_SOCKETS = parseInt(process.env.HTTP_MAX_SOCKETS, 10) || FETCH_MAX_CONCURRENCY;
+const HTTP_CACHE_DIR = process.env.HTTP_CACHE_DIR || '.http_cache';
+const HTTP_CACHE_MAX_BYTES = parseInt(process.env.HTTP_CACHE_MAX_BYTES, 10) || 50 * 1024 * 1024;
+const REQUEST_TIMEOUT_MS = parseInt(process.env.REQUEST_TIMEOUT_MS, 10) || 30 * 1000;
+const RETRY_MAX_ATTEMPTS = parseInt(process.env.RETRY_MAX_ATTEMPTS, 10) || 5;
+const RETRY_BUDGET = parseInt(process.env.RETRY_BUDGET, 10) || 50;
+const RETRY_BASE_DELAY_MS = 500;
+const RETRY_MAX_DELAY_MS = 30 * 1000;
+const RETRYABLE_STATUSES = new Set([408, 500, 502, 503, 504]);
+const RETRYABLE_ERROR_CODES = new Set([
+  'ECONNABORTED', 'ECONNREFUSED', 'ECONNRESET', 'EPIPE', 'ETIMEDOUT', 'EAI_AGAIN'
+]);
+const RATE_LIMIT_PER_SECOND = parseInt(process.env.RATE_LIMIT_PER_SECOND, 10) || 2;
+const RATE_LIMIT_PER_HOUR = parseInt(process.env.RATE_LIMIT_PER_HOUR, 10) || 1200;
+const LATENCY_BUCKETS_SECONDS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+
+const rateLimiter = createRateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_PER_HOUR);
+const concurrency = createConcurrencyController(FETCH_CONCURRENCY, FETCH_MAX_CONCURRENCY);
+const retryBudget = { remaining: RETRY_BUDGET };
+const metrics = createMetrics();
+const revalidatingEntries = new Set();
+const api = createApiClient();
+const outputFormats = createOutputFormats();
 
 async function main() {
   try {
-    const token = await getOAuthToken();
-    const studentUsers = await fetchAllStudents(token);
+    if (RESTORE_SNAPSHOT) {
+      restoreSnapshot(RESTORE_SNAPSHOT);
+      return;
+    }
+
+    const auth = createTokenProvider(createFileTokenStore(TOKEN_CACHE_FILE));
+    if (BATCH_JOBS_FILE) {
+      const unsupported = ['--incremental', '--sqlite', '--snapshot', '--changes']
+        .filter(flag => process.argv.includes(flag));
+      if (unsupported.length > 0) {
+        throw new Error(`${unsupported.join(', ')} cannot be combined with --batch`);
+      }
+      await runBatch(auth, BATCH_JOBS_FILE);
+      logMetrics();
+      return;
+    }
+    if (DAEMON) {
+      await runDaemon(auth);
+      return;
+    }
+
+    await runExport(auth, { incremental: INCREMENTAL });
+    logMetrics();
+  } catch (error) {
+    console.error('Error:', error.response ?
+      `${error.message} - ${JSON.stringify(error.response.data)}` :
+      error.message);
+    process.exit(1);
+  }
+}
+
+async function runExport(auth, { incremental, knownUsers = null }) {
+  retryBudget.remaining = RETRY_BUDGET;
+
+  const format = getOutputFormat(OUTPUT_FORMAT);
+  const outputFile = `${OUTPUT_BASENAME}${format.extension}`;
+  const previous = incremental ? loadSyncState(outputFile, knownUsers) : null;
+  const query = { ...DEFAULT_QUERY, filters: {} };
+  const sqlite = SQLITE_FILE ? openSqliteSink(SQLITE_FILE) : null;
+
+  if (previous) {
+    query.filters['range[updated_at]'] = `${previous.updatedAt},${new Date().toISOString()}`;
+    console.log(`Incremental sync: fetching changes since ${previous.updatedAt}`);
+  } else if (incremental) {
+    console.log('No previous sync state found, running a full export');
+  }
+
+  const startedAt = performance.now();
+  let userCount;
+  let exportedUsers = null;
+  try {
+    if (format.streaming && !previous) {
+      const result = await streamStudents(auth, query, outputFile, format, sqlite && sqlite.upsert);
+      saveSyncState(result.updatedAt);
+      userCount = result.count;
+    } else {
+      const studentUsers = await fetchStudents(auth, query);
+      const fetchedUsers = studentUsers.map(toFilteredUser);
+      const filteredUsers = previous ? mergeUsers(previous.users, fetchedUsers) : fetchedUsers;
+
+      writeUsers(outputFile, filteredUsers, format);
+      if (sqlite) {
+        sqlite.upsert(filteredUsers);
+      }
+      saveSyncState(latestUpdatedAt(studentUsers, previous ? previous.updatedAt : ''));
+      if (previous) {
+        console.log(`Merged ${fetchedUsers.length} changed student users`);
+      }
+      userCount = filteredUsers.length;
+      exportedUsers = filteredUsers;
+    }
+  } catch (error) {
+    if (sqlite) {
+      sqlite.close();
+    }
+    throw error;
+  } finally {
+    metrics.inc('fortytwo_export_seconds_total', {}, secondsSince(startedAt));
+  }
+
+  console.log(`Successfully fetched and filtered ${userCount} student users`);
+  console.log(`Results saved to ${outputFile}`);
+  if (sqlite) {
+    sqlite.close();
+    console.log(`Results upserted into ${SQLITE_FILE}`);
+  }
+  if (SNAPSHOT || CHANGE_FEED) {
+    exportedUsers = exportedUsers || readUsers(outputFile);
+  }
+  if (SNAPSHOT) {
+    recordSnapshot(exportedUsers);
+  }
+  if (CHANGE_FEED) {
+    writeChangeFeed(exportedUsers);
+  }
+
+  return { outputFile, users: exportedUsers };
+}
+
+async function runDaemon(auth) {
+  const state = { users: null, indexes: buildStudentIndexes([]), body: '[]', refreshedAt: null, lastError: null };
+  let refreshes = 0;
+  let timer = null;
+
+  const server = http.createServer((req, res) => {
+    const { pathname, searchParams } = new URL(req.url, 'http://localhost');
+    const headers = { 'Content-Type': 'application/json', 'X-Refreshed-At': state.refreshedAt || '' };
+    const loginMatch = /^\/students\/([^/]+)$/.exec(pathname);
+    if (req.method === 'GET' && pathname === '/students' && [...searchParams.keys()].length === 0) {
+      res.writeHead(200, headers);
+      res.end(state.body);
+    } else if (req.method === 'GET' && pathname === '/students') {
+      try {
+        const result = queryStudents(state.indexes, searchParams);
+        res.writeHead(200, headers);
+        res.end(JSON.stringify(result));
+      } catch (error) {
+        res.writeHead(400, headers);
+        res.end(JSON.stringify({ error: error.message }));
+      }
+    } else if (req.method === 'GET' && loginMatch) {
+      let login;
+      try {
+        login = decodeURIComponent(loginMatch[1]);
+      } catch (error) {
+        res.writeHead(400, headers);
+        res.end(JSON.stringify({ error: 'Invalid login' }));
+        return;
+      }
+      const user = state.indexes.byLogin.get(login);
+      res.writeHead(user ? 200 : 404, headers);
+      res.end(JSON.stringify(user || { error: 'Not Found' }));
+    } else if (req.method === 'GET' && pathname === '/metrics') {
+      res.writeHead(200, { 'Content-Type': 'text/plain; version=0.0.4' });
+      res.end(metrics.render());
+    } else if (req.method === 'GET' && pathname === '/health') {
+      res.writeHead(200, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({
+        refreshed_at: state.refreshedAt,
+        count: state.users ? state.users.length : 0,
+        last_error: state.lastError
+      }));
+    } else {
+      res.writeHead(404, { 'Content-Type': 'application/json' });
+      res.end(JSON.stringify({ error: 'Not Found' }));
+    }
+  });
+
+  const refresh = async () => {
+    const incremental = refreshes % DAEMON_FULL_REFRESH_EVERY !== 0;
+    refreshes++;
+    try {
+      console.log(`Starting ${incremental ? 'incremental' : 'full'} refresh`);
+      const result = await runExport(auth, { incremental, knownUsers: state.users });
+      state.users = result.users || readUsers(result.outputFile);
+      state.indexes = buildStudentIndexes(state.users);
+      state.body = JSON.stringify(state.users);
+      state.refreshedAt = new Date().toISOString();
+      state.lastError = null;
+      logMetrics();
+    } catch (error) {
+      state.lastError = error.message;
+      console.error('Refresh failed:', error.message);
+    }
+    timer = setTimeout(refresh, DAEMON_REFRESH_INTERVAL_MS);
+  };
+
+  const shutdown = () => {
+    console.log('Shutting down daemon');
+    clearTimeout(timer);
+    server.close(() => process.exit(0));
+  };
+  process.on('SIGINT', shutdown);
+  process.on('SIGTERM', shutdown);
+
+  await new Promise(resolve => server.listen(DAEMON_PORT, DAEMON_HOST, resolve));
+  console.log(`Serving the latest snapshot on http://${DAEMON_HOST}:${DAEMON_PORT}/students`);
+  await refresh();
+}
+
+function buildStudentIndexes(users) {
+  const byLevel = [...users].sort((a, b) => a.level - b.level);
+  const byBlackhole = users.filter(user => user.blackholed_at)
+    .sort((a, b) => (a.blackholed_at < b.blackholed_at ? -1 : 1));
+  const byLogin = new Map();
+  const byStatus = new Map();
+  const byPoolYear = new Map();
+
+  const addTo = (index, key, user) => {
+    if (!index.has(key)) {
+      index.set(key, []);
+    }
+    index.get(key).push(user);
+  };
+
+  users.forEach(user => {
+    byLogin.set(user.user.login, user);
+    addTo(byStatus, user.user.status, user);
+    addTo(byPoolYear, String(user.user.pool_year), user);
+  });
+
+  return { all: users, byLevel, byBlackhole, byLogin, byStatus, byPoolYear };
+}
+
+function queryStudents(indexes, params) {
+  const filters = [];
+  const candidates = [];
+  const levelMin = params.has('level_min') ? Number(params.get('level_min')) : -Infinity;
+  const levelMax = params.has('level_max') ? Number(params.get('level_max')) : Infinity;
+
+  if (Number.isNaN(levelMin) || Number.isNaN(levelMax)) {
+    throw new Error('level_min and level_max must be numbers');
+  }
+  if (params.has('level_min') || params.has('level_max')) {
+    candidates.push(indexes.byLevel.slice(
+      lowerBound(indexes.byLevel, user => user.level >= levelMin),
+      lowerBound(indexes.byLevel, user => user.level > levelMax)
+    ));
+    filters.push(user => user.level >= levelMin && user.level <= levelMax);
+  }
+  if (params.has('status')) {
+    const status = params.get('status');
+    candidates.push(indexes.byStatus.get(status) || []);
+    filters.push(user => user.user.status === status);
+  }
+  if (params.has('pool_year')) {
+    const poolYear = params.get('pool_year');
+    candidates.push(indexes.byPoolYear.get(poolYear) || []);
+    filters.push(user => String(user.user.pool_year) === poolYear);
+  }
+  if (params.has('pool_month')) {
+    const poolMonth = params.get('pool_month').toLowerCase();
+    filters.push(user => String(user.user.pool_month).toLowerCase() === poolMonth);
+  }
+  if (params.has('blackhole_within_days')) {
+    const days = Number(params.get('blackhole_within_days'));
+    if (Number.isNaN(days)) {
+      throw new Error('blackhole_within_days must be a number');
+    }
+    const from = new Date().toISOString();
+    const to = new Date(Date.now() + days * 24 * 60 * 60 * 1000).toISOString();
+    candidates.push(indexes.byBlackhole.slice(
+      lowerBound(indexes.byBlackhole, user => user.blackholed_at >= from),
+      lowerBound(indexes.byBlackhole, user => user.blackholed_at > to)
+    ));
+    filters.push(user => user.blackholed_at >= from && user.blackholed_at <= to);
+  }
+
+  const smallest = candidates.reduce(
+    (best, candidate) => (candidate.length < best.length ? candidate : best), indexes.all);
+  const matches = smallest.filter(user => filters.every(filter => filter(user)));
+
+  const sort = params.get('sort') || '-level';
+  const descending = sort.startsWith('-');
+  const field = descending ? sort.slice(1) : sort;
+  const sortValue = {
+    level: user => user.level,
+    wallet: user => user.user.wallet,
+    login: user => user.user.login,
+    blackholed_at: user => user.blackholed_at || ''
+  }[field];
+  if (!sortValue) {
+    throw new Error(`Cannot sort by ${field}`);
+  }
+  matches.sort((a, b) => {
+    const left = sortValue(a);
+    const right = sortValue(b);
+    const order = left < right ? -1 : (left > right ? 1 : 0);
+    return descending ? -order : order;
+  });
+
+  const page = Math.max(1, parseInt(params.get('page'), 10) || 1);
+  const perPage = Math.min(1000, Math.max(1, parseInt(params.get('per_page'), 10) || 100));
+  return {
+    total: matches.length,
+    page,
+    per_page: perPage,
+    results: matches.slice((page - 1) * perPage, page * perPage)
+  };
+}
+
+function lowerBound(sorted, isAtOrAfter) {
+  let low = 0;
+  let high = sorted.length;
+  while (low < high) {
+    const middle = (low + high) >> 1;
+    if (isAtOrAfter(sorted[middle])) {
+      high = middle;
+    } else {
+      low = middle + 1;
+    }
+  }
+  return low;
+}
+
+async function streamStudents(auth, query, file, format, onUsers = null) {
+  const output = createOutputWriter(file, format);
+  const fileStream = fs.createWriteStream(output.tempFile);
+  const stream = format.compressor ? format.compressor() : fileStream;
+  const done = stream === fileStream ? finished(fileStream) : pipeline(stream, fileStream);
+  done.catch(() => {});
+  let count = 0;
+  let updatedAt = '';
+
+  const writePage = async users => {
+    if (users.length === 0) {
+      return;
+    }
+    const startedAt = performance.now();
+    const filteredUsers = users.map(toFilteredUser);
+    const lines = format.encodePage(filteredUsers);
+    if (onUsers) {
+      onUsers(filteredUsers);
+    }
+    count += users.length;
+    updatedAt = latestUpdatedAt(users, updatedAt);
+    if (!stream.write(lines)) {
+      await Promise.race([once(stream, 'drain'), done]);
+    }
+    metrics.inc('fortytwo_output_write_seconds_total', {}, secondsSince(startedAt));
+  };
+
+  try {
+    await fetchStudents(auth, query, writePage);
+  } catch (error) {
+    stream.end();
+    await done.catch(() => {});
+    output.abort();
+    throw error;
+  }
+  const startedAt = performance.now();
+  stream.end();
+  await done;
+  output.commit();
+  metrics.inc('fortytwo_output_write_seconds_total', {}, secondsSince(startedAt));
+
+  return { count, updatedAt };
+}
+
+async function runBatch(auth, jobsFile) {
+  const queries = JSON.parse(fs.readFileSync(jobsFile, 'utf8')).map(toBatchQuery);
+  const results = new Array(queries.length);
+  let nextJob = 0;
+
+  console.log(`Running ${queries.length} export jobs from ${jobsFile}`);
+
+  const worker = async () => {
+    while (nextJob < queries.length) {
+      const index = nextJob++;
+      const query = queries[index];
+      const output = `${OUTPUT_BASENAME}_${query.label}${getOutputFormat(OUTPUT_FORMAT).extension}`;
+      const result = {
+        campus_id: query.campusId,
+        cursus_id: query.cursusId,
+        level_range: query.levelRange,
+        output
+      };
+
+      try {
+        result.count = await exportQuery(auth, query, output);
+        console.log(`${logPrefix(query)}Saved ${result.count} student users to ${output}`);
+      } catch (error) {
+        result.error = error.message;
+        console.error(`${logPrefix(query)}Export failed: ${error.message}`);
+      }
+      result.finished_at = new Date().toISOString();
+      results[index] = result;
+    }
+  };
+
+  const startedAt = performance.now();
+  await Promise.all(Array.from({ length: Math.min(BATCH_CONCURRENCY, queries.length) }, worker));
+  metrics.inc('fortytwo_export_seconds_total', {}, secondsSince(startedAt));
+
+  writeFileAtomic(BATCH_INDEX_FILE, JSON.stringify(results, null, 2));
+  console.log(`Batch index saved to ${BATCH_INDEX_FILE}`);
 
-    const filteredUsers = studentUsers.map(user => ({
+  const failed = results.filter(result => result.error);
+  if (failed.length > 0) {
+    throw new Error(`${failed.length} of ${results.length} export jobs failed`);
+  }
+}
+
+function toBatchQuery(job) {
+  const query = {
+    campusId: job.campus_id || CAMPUS_ID,
+    cursusId: job.cursus_id || CURSUS_ID,
+    levelRange: job.level || DEFAULT_QUERY.levelRange,
+    filters: {}
+  };
+  query.label = `${query.campusId}_${query.cursusId}_${query.levelRange.join('-')}`;
+  return query;
+}
+
+async function exportQuery(auth, query, file) {
+  const format = getOutputFormat(OUTPUT_FORMAT);
+  if (format.streaming) {
+    return (await streamStudents(auth, query, file, format)).count;
+  }
+  const users = (await fetchStudents(auth, query)).map(toFilteredUser);
+  writeUsers(file, users, format);
+  return users.length;
+}
+
+function logPrefix(query) {
+  return query.label ? `[${query.label}] ` : '';
+}
+
+function argValue(name) {
+  const index = process.argv.indexOf(name);
+  return index === -1 ? null : process.argv[index + 1];
+}
+
+function openSqliteSink(file) {
+  const Database = requireOptional('better-sqlite3', '--sqlite');
+  const db = new Database(file);
+  db.pragma('journal_mode = WAL');
+  db.exec(`
+    CREATE TABLE IF NOT EXISTS students (
+      id INTEGER PRIMARY KEY,
+      login TEXT NOT NULL,
+      name TEXT,
+      level REAL,
+      grade TEXT,
+      cursus_id INTEGER,
+      wallet INTEGER,
+      status TEXT,
+      pool_month TEXT,
+      pool_year TEXT,
+      blackholed_at TEXT,
+      synced_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS students_login ON students (login);
+    CREATE INDEX IF NOT EXISTS students_level ON students (level);
+    CREATE INDEX IF NOT EXISTS students_pool ON students (pool_year, pool_month);
+    CREATE INDEX IF NOT EXISTS students_blackholed_at ON students (blackholed_at);
+    CREATE INDEX IF NOT EXISTS students_status ON students (status);
+  `);
+
+  const statement = db.prepare(`
+    INSERT INTO students (id, login, name, level, grade, cursus_id, wallet, status,
+      pool_month, pool_year, blackholed_at, synced_at)
+    VALUES (@id, @login, @name, @level, @grade, @cursus_id, @wallet, @status,
+      @pool_month, @pool_year, @blackholed_at, @synced_at)
+    ON CONFLICT (id) DO UPDATE SET
+      login = excluded.login,
+      name = excluded.name,
+      level = excluded.level,
+      grade = excluded.grade,
+      cursus_id = excluded.cursus_id,
+      wallet = excluded.wallet,
+      status = excluded.status,
+      pool_month = excluded.pool_month,
+      pool_year = excluded.pool_year,
+      blackholed_at = excluded.blackholed_at,
+      synced_at = excluded.synced_at
+  `);
+  const syncedAt = new Date().toISOString();
+  const upsertAll = db.transaction(users => {
+    users.forEach(user => statement.run({
       id: user.id,
+      login: user.user.login,
+      name: user.user.name,
       level: user.level,
       grade: user.grade,
       cursus_id: user.cursus_id,
+      wallet: user.user.wallet,
+      status: user.user.status,
+      pool_month: user.user.pool_month,
+      pool_year: user.user.pool_year,
       blackholed_at: user.blackholed_at,
-      user: {
-        login: user.user.login,
-        name: user.user.usual_full_name || `${user.user.first_name} ${user.user.last_name}`,
-        wallet: user.user.wallet,
-        status: user.user.alumni ? 'Alumni' : (user.user.active ? 'Active' : 'Inactive'),
-        pool_month: user.user.pool_month,
-        pool_year: user.user.pool_year
-      }
+      synced_at: syncedAt
     }));
+  });
 
-    fs.writeFileSync(NON_STAFF_FILE, JSON.stringify(filteredUsers, null, 2));
-    console.log(`Successfully fetched and filtered ${filteredUsers.length} student users`);
-    console.log(`Results saved to ${NON_STAFF_FILE}`);
+  return {
+    upsert: users => upsertAll(users),
+    close: () => db.close()
+  };
+}
+
+function writeChangeFeed(users) {
+  let previousHashes = null;
+  try {
+    previousHashes = JSON.parse(fs.readFileSync(RECORD_HASHES_FILE, 'utf8'));
   } catch (error) {
-    console.error('Error:', error.response ?
-      `${error.message} - ${JSON.stringify(error.response.data)}` :
-      error.message);
-    process.exit(1);
+    console.log('No previous record hashes found, reporting every record as added');
+  }
+
+  const hashes = {};
+  const changes = [];
+  const counts = { added: 0, modified: 0, removed: 0 };
+
+  users.forEach(user => {
+    const hash = crypto.createHash('sha1').update(JSON.stringify(user)).digest('hex').slice(0, 16);
+    const previousHash = previousHashes ? previousHashes[user.id] : undefined;
+    hashes[user.id] = hash;
+    if (previousHash !== hash) {
+      const op = previousHash === undefined ? 'added' : 'modified';
+      counts[op]++;
+      changes.push({ op, id: user.id, record: user });
+    }
+  });
+
+  Object.keys(previousHashes || {}).forEach(id => {
+    if (!(id in hashes)) {
+      counts.removed++;
+      changes.push({ op: 'removed', id: Number(id) });
+    }
+  });
+
+  writeFileAtomic(CHANGES_FILE, changes.map(change => `${JSON.stringify(change)}\n`).join(''));
+  writeFileAtomic(RECORD_HASHES_FILE, JSON.stringify(hashes));
+  console.log(`Change feed saved to ${CHANGES_FILE}: ${counts.added} added, ` +
+    `${counts.modified} modified, ${counts.removed} removed`);
+}
+
+function recordSnapshot(users) {
+  const index = loadSnapshotIndex();
+  const previous = index[index.length - 1];
+  const lastFull = index.reduce((latest, entry) => (entry.type === 'full' ? entry : latest), null);
+  const id = previous ? previous.id + 1 : 1;
+  const entry = { id, taken_at: new Date().toISOString(), count: users.length };
+
+  let payload;
+  if (!lastFull || id - lastFull.id >= SNAPSHOT_FULL_EVERY) {
+    entry.type = 'full';
+    payload = users;
+  } else {
+    entry.type = 'delta';
+    payload = diffSnapshots(reconstructSnapshot(index, previous.id), users);
+  }
+  entry.file = `${entry.type}-${id}.json.gz`;
+
+  fs.mkdirSync(SNAPSHOT_DIR, { recursive: true });
+  writeFileAtomic(path.join(SNAPSHOT_DIR, entry.file), zlib.gzipSync(JSON.stringify(payload)));
+  index.push(entry);
+  writeFileAtomic(path.join(SNAPSHOT_DIR, 'index.json'), JSON.stringify(index, null, 2));
+
+  console.log(entry.type === 'full' ?
+    `Snapshot ${id} stored in full` :
+    `Snapshot ${id} stored as delta: ${payload.added.length} added, ` +
+    `${payload.removed.length} removed, ${Object.keys(payload.changed).length} changed`);
+}
+
+function restoreSnapshot(target) {
+  const index = loadSnapshotIndex();
+  const entry = /^\d+$/.test(target) ?
+    index.find(candidate => candidate.id === Number(target)) :
+    index.filter(candidate => candidate.taken_at <= new Date(target).toISOString()).pop();
+
+  if (!entry) {
+    throw new Error(`No snapshot found for ${target}`);
+  }
+
+  const users = [...reconstructSnapshot(index, entry.id).values()].sort((a, b) => b.level - a.level);
+  const file = `student_users_snapshot_${entry.id}.json`;
+  writeFileAtomic(file, JSON.stringify(users, null, 2));
+  console.log(`Restored snapshot ${entry.id} from ${entry.taken_at} (${users.length} student users) to ${file}`);
+}
+
+function loadSnapshotIndex() {
+  try {
+    return JSON.parse(fs.readFileSync(path.join(SNAPSHOT_DIR, 'index.json'), 'utf8'));
+  } catch (error) {
+    return [];
+  }
+}
+
+function reconstructSnapshot(index, id) {
+  const chain = index.filter(entry => entry.id <= id);
+  const start = chain.map(entry => entry.type).lastIndexOf('full');
+  const usersById = new Map();
+
+  for (const entry of chain.slice(start)) {
+    const payload = JSON.parse(zlib.gunzipSync(fs.readFileSync(path.join(SNAPSHOT_DIR, entry.file))));
+    if (entry.type === 'full') {
+      payload.forEach(user => usersById.set(user.id, user));
+    } else {
+      payload.removed.forEach(userId => usersById.delete(userId));
+      payload.added.forEach(user => usersById.set(user.id, user));
+      Object.entries(payload.changed).forEach(([userId, changes]) => {
+        const user = usersById.get(Number(userId));
+        usersById.set(Number(userId), {
+          ...user,
+          ...changes,
+          user: { ...user.user, ...changes.user }
+        });
+      });
+    }
+  }
+
+  return usersById;
+}
+
+function diffSnapshots(previousById, users) {
+  const delta = { added: [], removed: [], changed: {} };
+  const currentIds = new Set();
+
+  users.forEach(user => {
+    currentIds.add(user.id);
+    const previous = previousById.get(user.id);
+    if (!previous) {
+      delta.added.push(user);
+      return;
+    }
+    const changes = diffFields(previous, user);
+    const userChanges = diffFields(previous.user, user.user);
+    if (Object.keys(userChanges).length > 0) {
+      changes.user = userChanges;
+    }
+    if (Object.keys(changes).length > 0) {
+      delta.changed[user.id] = changes;
+    }
+  });
+
+  previousById.forEach((user, userId) => {
+    if (!currentIds.has(userId)) {
+      delta.removed.push(userId);
+    }
+  });
+
+  return delta;
+}
+
+function diffFields(previous, current) {
+  const changes = {};
+  Object.keys(current).forEach(key => {
+    const value = current[key];
+    if ((value === null || typeof value !== 'object') && value !== previous[key]) {
+      changes[key] = value;
+    }
+  });
+  return changes;
+}
+
+function readUsers(file) {
+  return formatForFile(file).decode(fs.readFileSync(file));
+}
+
+function writeUsers(file, users, format = formatForFile(file)) {
+  const startedAt = performance.now();
+  const output = createOutputWriter(file, format);
+  try {
+    fs.writeFileSync(output.tempFile, format.encode(users));
+  } catch (error) {
+    output.abort();
+    throw error;
+  }
+  output.commit();
+  metrics.inc('fortytwo_output_write_seconds_total', {}, secondsSince(startedAt));
+}
+
+function createOutputWriter(file, format) {
+  const target = VERSIONED_OUTPUT ?
+    `${file.slice(0, -format.extension.length)}-${new Date().toISOString().replace(/[:.]/g, '-')}${format.extension}` :
+    file;
+  const tempFile = tempPathFor(target);
+  removeStaleTempFiles(file, format.extension);
+
+  return {
+    tempFile,
+    commit() {
+      commitFile(tempFile, target);
+      if (VERSIONED_OUTPUT) {
+        const tempLink = tempPathFor(file);
+        fs.symlinkSync(path.basename(target), tempLink);
+        fs.renameSync(tempLink, file);
+        pruneVersions(file, format.extension);
+      }
+    },
+    abort() {
+      fs.rmSync(tempFile, { force: true });
+    }
+  };
+}
+
+function pruneVersions(file, extension) {
+  const directory = path.dirname(file);
+  const pattern = new RegExp(`^${escapeRegExp(path.basename(file).slice(0, -extension.length))}` +
+    `-${VERSION_TIMESTAMP_PATTERN}${escapeRegExp(extension)}$`);
+  const versions = fs.readdirSync(directory)
+    .filter(name => pattern.test(name))
+    .sort();
+  versions.slice(0, Math.max(0, versions.length - OUTPUT_KEEP_VERSIONS))
+    .forEach(name => fs.rmSync(path.join(directory, name), { force: true }));
+}
+
+function removeStaleTempFiles(file, extension) {
+  const directory = path.dirname(file);
+  const pattern = new RegExp(`^\\.${escapeRegExp(path.basename(file).slice(0, -extension.length))}` +
+    `(-${VERSION_TIMESTAMP_PATTERN})?${escapeRegExp(extension)}\\.(\\d+)\\.tmp$`);
+  fs.readdirSync(directory).forEach(name => {
+    const match = pattern.exec(name);
+    if (match && !isProcessRunning(Number(match[2]))) {
+      fs.rmSync(path.join(directory, name), { force: true });
+    }
+  });
+}
+
+function isProcessRunning(pid) {
+  try {
+    process.kill(pid, 0);
+    return true;
+  } catch (error) {
+    return error.code === 'EPERM';
+  }
+}
+
+function escapeRegExp(text) {
+  return text.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+}
+
+function writeFileAtomic(file, data, options) {
+  const tempFile = tempPathFor(file);
+  try {
+    fs.writeFileSync(tempFile, data, options);
+    commitFile(tempFile, file);
+  } catch (error) {
+    fs.rmSync(tempFile, { force: true });
+    throw error;
+  }
+}
+
+function commitFile(tempFile, file) {
+  const fd = fs.openSync(tempFile, 'r+');
+  try {
+    fs.fsyncSync(fd);
+  } finally {
+    fs.closeSync(fd);
+  }
+  fs.renameSync(tempFile, file);
+  try {
+    const directoryFd = fs.openSync(path.dirname(file), 'r');
+    fs.fsyncSync(directoryFd);
+    fs.closeSync(directoryFd);
+  } catch (error) {
+    // Directories cannot be fsynced on every platform; the rename is still atomic.
+  }
+}
+
+function tempPathFor(file) {
+  return path.join(path.dirname(file), `.${path.basename(file)}.${process.pid}.tmp`);
+}
+
+function parseCursusUsers(data) {
+  if (typeof data !== 'string' || data === '') {
+    return data;
+  }
+  let parsed;
+  try {
+    parsed = JSON.parse(data);
+  } catch (error) {
+    return data;
+  }
+  return Array.isArray(parsed) ? parsed.map(projectCursusUser) : parsed;
+}
+
+function projectCursusUser(cursusUser) {
+  const { user = {} } = cursusUser;
+  return {
+    id: cursusUser.id,
+    level: cursusUser.level,
+    grade: cursusUser.grade,
+    cursus_id: cursusUser.cursus_id,
+    blackholed_at: cursusUser.blackholed_at,
+    updated_at: cursusUser.updated_at,
+    user: {
+      login: user.login,
+      usual_full_name: user.usual_full_name,
+      first_name: user.first_name,
+      last_name: user.last_name,
+      wallet: user.wallet,
+      alumni: user.alumni,
+      active: user.active,
+      pool_month: user.pool_month,
+      pool_year: user.pool_year
+    }
+  };
+}
+
+function toFilteredUser(user) {
+  return {
+    id: user.id,
+    level: user.level,
+    grade: user.grade,
+    cursus_id: user.cursus_id,
+    blackholed_at: user.blackholed_at,
+    user: {
+      login: user.user.login,
+      name: user.user.usual_full_name || `${user.user.first_name} ${user.user.last_name}`,
+      wallet: user.user.wallet,
+      status: user.user.alumni ? 'Alumni' : (user.user.active ? 'Active' : 'Inactive'),
+      pool_month: user.user.pool_month,
+      pool_year: user.user.pool_year
+    }
+  };
+}
+
+function createOutputFormats() {
+  const toLines = users => users.map(user => `${JSON.stringify(user)}\n`).join('');
+  const fromLines = buffer => buffer.toString('utf8').split('\n').filter(Boolean).map(line => JSON.parse(line));
+
+  return {
+    json: {
+      extension: '.json',
+      encode: users => JSON.stringify(users, null, 2),
+      decode: buffer => JSON.parse(buffer.toString('utf8'))
+    },
+    'json-compact': {
+      extension: '.min.json',
+      encode: users => JSON.stringify(users),
+      decode: buffer => JSON.parse(buffer.toString('utf8'))
+    },
+    ndjson: {
+      extension: '.ndjson',
+      streaming: true,
+      encodePage: toLines,
+      encode: toLines,
+      decode: fromLines
+    },
+    'ndjson.gz': {
+      extension: '.ndjson.gz',
+      streaming: true,
+      compressor: () => zlib.createGzip(),
+      encodePage: toLines,
+      encode: users => zlib.gzipSync(toLines(users)),
+      decode: buffer => fromLines(zlib.gunzipSync(buffer))
+    },
+    'ndjson.zst': {
+      extension: '.ndjson.zst',
+      streaming: true,
+      check: requireZstd,
+      compressor: () => requireZstd().createZstdCompress(),
+      encodePage: toLines,
+      encode: users => requireZstd().zstdCompressSync(toLines(users)),
+      decode: buffer => fromLines(requireZstd().zstdDecompressSync(buffer))
+    },
+    msgpack: {
+      extension: '.msgpack',
+      check: () => requireOptional('@msgpack/msgpack', 'MessagePack output'),
+      encode: encodeMsgpack,
+      decode: decodeMsgpack
+    },
+    arrow: {
+      extension: '.arrow',
+      check: () => requireOptional('apache-arrow', 'Arrow output'),
+      encode: encodeArrow,
+      decode: decodeArrow
+    }
+  };
+}
+
+function getOutputFormat(name) {
+  if (!Object.prototype.hasOwnProperty.call(outputFormats, name)) {
+    throw new Error(`Unknown output format ${name} (expected one of ${Object.keys(outputFormats).join(', ')})`);
+  }
+  const format = outputFormats[name];
+  if (format.check) {
+    format.check();
+  }
+  return format;
+}
+
+function formatForFile(file) {
+  return Object.values(outputFormats)
+    .filter(format => file.endsWith(format.extension))
+    .sort((a, b) => b.extension.length - a.extension.length)[0] || outputFormats.json;
+}
+
+function requireZstd() {
+  if (typeof zlib.zstdCompressSync !== 'function') {
+    throw new Error('zstd output requires Node.js 22.15 or newer');
   }
+  return zlib;
+}
+
+function requireOptional(name, feature) {
+  try {
+    return require(name);
+  } catch (error) {
+    throw new Error(`${feature} requires the ${name} package (npm install ${name})`);
+  }
+}
+
+function encodeMsgpack(users) {
+  const { encode } = requireOptional('@msgpack/msgpack', 'MessagePack output');
+  return Buffer.from(encode(users));
+}
+
+function decodeMsgpack(buffer) {
+  const { decode } = requireOptional('@msgpack/msgpack', 'MessagePack input');
+  return decode(buffer);
+}
+
+function encodeArrow(users) {
+  const { tableFromArrays, tableToIPC } = requireOptional('apache-arrow', 'Arrow output');
+  const rows = users.map(flattenUser);
+  const columns = {};
+  Object.keys(flattenUser({ user: {} })).forEach(column => {
+    columns[column] = rows.map(row => (row[column] === undefined ? null : row[column]));
+  });
+  return Buffer.from(tableToIPC(tableFromArrays(columns), 'file'));
+}
+
+function decodeArrow(buffer) {
+  const { tableFromIPC } = requireOptional('apache-arrow', 'Arrow input');
+  return tableFromIPC(buffer).toArray().map(row => unflattenUser(row.toJSON()));
+}
+
+function flattenUser(user) {
+  return {
+    id: user.id,
+    level: user.level,
+    grade: user.grade,
+    cursus_id: user.cursus_id,
+    blackholed_at: user.blackholed_at,
+    login: user.user.login,
+    name: user.user.name,
+    wallet: user.user.wallet,
+    status: user.user.status,
+    pool_month: user.user.pool_month,
+    pool_year: user.user.pool_year
+  };
+}
+
+function unflattenUser(row) {
+  return {
+    id: row.id,
+    level: row.level,
+    grade: row.grade,
+    cursus_id: row.cursus_id,
+    blackholed_at: row.blackholed_at,
+    user: {
+      login: row.login,
+      name: row.name,
+      wallet: row.wallet,
+      status: row.status,
+      pool_month: row.pool_month,
+      pool_year: row.pool_year
+    }
+  };
+}
+
+function loadSyncState(outputFile, knownUsers = null) {
+  try {
+    const state = JSON.parse(fs.readFileSync(SYNC_STATE_FILE, 'utf8'));
+    const users = knownUsers || readUsers(outputFile);
+    return state.updated_at ? { updatedAt: state.updated_at, users } : null;
+  } catch (error) {
+    return null;
+  }
+}
+
+function saveSyncState(updatedAt) {
+  if (updatedAt) {
+    writeFileAtomic(SYNC_STATE_FILE, JSON.stringify({ updated_at: updatedAt }));
+  }
+}
+
+function latestUpdatedAt(users, since) {
+  return users.reduce(
+    (latest, user) => (user.updated_at && user.updated_at > latest ? user.updated_at : latest),
+    since
+  );
+}
+
+function mergeUsers(existingUsers, changedUsers) {
+  const usersById = new Map(existingUsers.map(user => [user.id, user]));
+  changedUsers.forEach(user => usersById.set(user.id, user));
+  return [...usersById.values()].sort((a, b) => b.level - a.level);
 }
 
 async function getOAuthToken() {
   try {
-    const response = await axios.post(`${BASE_URL}/oauth/token`, {
-      grant_type: 'client_credentials',
-      client_id: CLIENT_ID,
-      client_secret: CLIENT_SECRET
+    const response = await withRetry('OAuth token request', async () => {
+      await rateLimiter.acquire();
+      return api.post('/oauth/token', {
+        grant_type: 'client_credentials',
+        client_id: CLIENT_ID,
+        client_secret: CLIENT_SECRET
+      });
     });
-    return response.data.access_token;
+    const issuedAt = response.data.created_at ? response.data.created_at * 1000 : Date.now();
+    return {
+      client_id: CLIENT_ID,
+      access_token: response.data.access_token,
+      expires_at: issuedAt + response.data.expires_in * 1000
+    };
   } catch (error) {
     console.error('Failed to obtain OAuth token:',
       error.response ? JSON.stringify(error.response.data) : error.message);
@@ -56,47 +1075,458 @@ async function getOAuthToken() {
   }
 }
 
-async function fetchAllStudents(token) {
-  let page = 1;
-  const perPage = 100;
+function createTokenProvider(store) {
+  let current = null;
+  let pending = null;
+
+  const isUsable = entry => Boolean(entry && entry.client_id === CLIENT_ID &&
+    entry.access_token && entry.expires_at - TOKEN_REFRESH_MARGIN_MS > Date.now());
+
+  const refresh = staleToken => {
+    if (isUsable(current) && current.access_token !== staleToken) {
+      return Promise.resolve(current.access_token);
+    }
+    if (!pending) {
+      pending = getOAuthToken()
+        .then(entry => {
+          current = entry;
+          store.save(entry);
+          return entry.access_token;
+        })
+        .finally(() => {
+          pending = null;
+        });
+    }
+    return pending;
+  };
+
+  return {
+    async getToken() {
+      if (!isUsable(current)) {
+        current = store.load();
+      }
+      return isUsable(current) ? current.access_token : refresh();
+    },
+    refresh
+  };
+}
+
+function createFileTokenStore(file) {
+  return {
+    load() {
+      try {
+        return JSON.parse(fs.readFileSync(file, 'utf8'));
+      } catch (error) {
+        return null;
+      }
+    },
+    save(entry) {
+      writeFileAtomic(file, JSON.stringify(entry), { mode: 0o600 });
+    }
+  };
+}
+
+function fetchStudents(auth, query, onPage = null) {
+  if (SHARDED) {
+    return fetchShardedStudents(auth, query, onPage);
+  }
+  return KEYSET ? fetchStudentsByKeyset(auth, query, onPage) : fetchAllStudents(auth, query, onPage);
+}
+
+async function fetchStudentsByKeyset(auth, query, onPage = null) {
+  const students = [];
+  let cursor = 0;
+  let users;
+  let perPage;
+
+  console.log(`${logPrefix(query)}Fetching all student users by id cursor...`);
+
+  do {
+    const response = await fetchPage(auth, 1, {
+      ...query,
+      sort: 'id',
+      filters: { ...query.filters, 'range[id]': `${cursor + 1},${MAX_ID}` }
+    });
+    users = response.data;
+    perPage = parseInt(response.headers['x-per-page'], 10);
+    students.push(...users);
+    if (users.length > 0) {
+      cursor = users[users.length - 1].id;
+    }
+  } while (users.length > 0 && (Number.isNaN(perPage) || users.length >= perPage));
+
+  students.sort((a, b) => b.level - a.level);
+  if (!onPage) {
+    return students;
+  }
+  for (let i = 0; i < students.length; i += PER_PAGE) {
+    await onPage(students.slice(i, i + PER_PAGE));
+  }
+  return [];
+}
+
+async function fetchShardedStudents(auth, query, onPage = null) {
+  const allStudents = [];
+  const sink = onPage || (users => { allStudents.push(...users); });
+  const shards = await planShards(auth, query, query.levelRange);
+  const deliveredIds = new Set();
+
+  console.log(`${logPrefix(query)}Fetching ${shards.length} level shards: ` +
+    shards.map(shard => shard.levelRange.join('-')).join(', '));
+
+  // Neighbouring shards share their boundary level, so students exactly on it are dropped here.
+  const deliver = createPageSequencer(async users => {
+    const unique = users.filter(user => !deliveredIds.has(user.id));
+    unique.forEach(user => deliveredIds.add(user.id));
+    await sink(unique);
+  });
+
+  await Promise.all(shards.map(async (shard, index) => {
+    const users = KEYSET ? await fetchStudentsByKeyset(auth, shard) : await fetchAllStudents(auth, shard);
+    await deliver(index + 1, users);
+  }));
+
+  return allStudents;
+}
+
+async function planShards(auth, query, [low, high]) {
+  const shard = {
+    ...query,
+    levelRange: [low, high],
+    label: `${query.label ? `${query.label}_` : ''}levels_${low}-${high}`
+  };
+  const total = await countStudents(auth, shard);
+  const middle = Math.floor(((low + high) / 2) * 100) / 100;
+
+  if (Number.isNaN(total) || total <= SHARD_MAX_PAGES * PER_PAGE || middle <= low || middle >= high) {
+    return [shard];
+  }
+
+  const [upper, lower] = await Promise.all([
+    planShards(auth, query, [middle, high]),
+    planShards(auth, query, [low, middle])
+  ]);
+  return [...upper, ...lower];
+}
+
+async function fetchAllStudents(auth, query = DEFAULT_QUERY, onPage = null) {
   let allStudents = [];
-  let hasMorePages = true;
+  const sink = onPage || (users => { allStudents.push(...users); });
+  const checkpoint = openCheckpoint(query);
+  const prefetch = createPrefetchWindow(PREFETCH_DEPTH);
+  const levelsById = new Map();
+  let duplicates = 0;
+
+  const deliver = createPageSequencer(async users => {
+    const unique = users.filter(user => {
+      if (levelsById.has(user.id)) {
+        duplicates++;
+        return false;
+      }
+      levelsById.set(user.id, user.level);
+      return true;
+    });
+    await sink(unique);
+    prefetch.advance();
+  });
 
-  console.log('Fetching all student users with level > 0...');
+  const loadPage = async page => {
+    if (checkpoint.pages.has(page)) {
+      return checkpoint.pages.get(page);
+    }
+    const users = (await fetchPage(auth, page, query)).data;
+    checkpoint.record(page, users);
+    return users;
+  };
+
+  console.log(`${logPrefix(query)}Fetching all student users with level > 0...`);
+
+  const first = await fetchPage(auth, 1, query);
+  const total = parseInt(first.headers['x-total'], 10);
+  const perPage = parseInt(first.headers['x-per-page'], 10) || PER_PAGE;
+  const firstPage = first.data;
+
+  if (checkpoint.resumed && checkpoint.header.total === (Number.isNaN(total) ? null : total) &&
+    checkpoint.header.perPage === perPage) {
+    console.log(`${logPrefix(query)}Resuming export from checkpoint with ${checkpoint.pages.size} pages already fetched`);
+  } else {
+    if (checkpoint.resumed) {
+      console.log(`${logPrefix(query)}Discarding checkpoint: the API now reports ${total} student users ` +
+        `(${perPage} per page) instead of ${checkpoint.header.total} (${checkpoint.header.perPage} per page)`);
+    }
+    checkpoint.start(Number.isNaN(total) ? null : total, perPage);
+  }
+  checkpoint.record(1, firstPage);
+
+  await deliver(1, firstPage);
+
+  if (total === null || Number.isNaN(total)) {
+    await fetchRemainingSequentially(firstPage, loadPage, deliver);
+  } else {
+    const pageCount = Math.ceil(total / perPage);
+    let nextPage = 2;
+
+    console.log(`${logPrefix(query)}Found ${total} student users across ${pageCount} pages`);
+
+    let delivered = Promise.resolve();
+
+    const worker = async () => {
+      while (nextPage <= pageCount) {
+        const page = nextPage++;
+        await prefetch.reserve(page);
+        delivered = deliver(page, await loadPage(page));
+        delivered.catch(prefetch.fail);
+      }
+    };
+
+    const workerCount = Math.max(0, Math.min(FETCH_MAX_CONCURRENCY, pageCount - 1));
+    await Promise.all(Array.from({ length: workerCount }, worker));
+    await delivered;
+  }
+
+  if (!isConsistent(total, levelsById.size, duplicates)) {
+    const users = await reconcileLevelBands(auth, query, levelsById);
+    const recovered = users.filter(user => !levelsById.has(user.id));
+    if (onPage) {
+      await onPage(recovered);
+    } else {
+      const refreshed = new Map(users.map(user => [user.id, user]));
+      allStudents = allStudents
+        .map(user => refreshed.get(user.id) || user)
+        .concat(recovered)
+        .sort((a, b) => b.level - a.level);
+    }
+    recovered.forEach(user => levelsById.set(user.id, user.level));
+    if (!isConsistent(total, levelsById.size, 0)) {
+      console.warn(`${logPrefix(query)}Warning: reconciliation did not account for every student user`);
+    }
+  }
+  checkpoint.clear();
+
+  return allStudents;
+}
+
+async function fetchRemainingSequentially(firstPage, loadPage, deliver) {
+  const inFlight = [];
+  let page = 2;
+  let users = firstPage;
+
+  while (users.length > 0) {
+    while (inFlight.length < PREFETCH_DEPTH) {
+      const pending = loadPage(page + inFlight.length);
+      pending.catch(() => {});
+      inFlight.push(pending);
+    }
+    users = await inFlight.shift();
+    await deliver(page, users);
+    page++;
+  }
+  await Promise.allSettled(inFlight);
+}
+
+function isConsistent(total, uniqueCount, duplicates) {
+  if (duplicates > 0) {
+    console.warn(`Warning: ${duplicates} student users appeared on more than one page ` +
+      '(records shifted between pages during the export)');
+  }
+  if (total === null || Number.isNaN(total)) {
+    return true;
+  }
+  if (uniqueCount !== total) {
+    console.warn(`Warning: fetched ${uniqueCount} unique student users but the API reported ${total}`);
+    return false;
+  }
+  return duplicates === 0;
+}
+
+async function reconcileLevelBands(auth, query, levelsById) {
+  const [low, high] = query.levelRange;
+  const bands = [];
+  for (let level = Math.floor(low); level <= high; level++) {
+    bands.push([Math.max(level, low), Math.min(level + 1, high)]);
+  }
+
+  const levels = [...levelsById.values()];
+  const serverCounts = await Promise.all(bands.map(band =>
+    countStudents(auth, { ...query, levelRange: band })));
+  const mismatched = bands.filter(([bandLow, bandHigh], index) =>
+    serverCounts[index] !== levels.filter(level => level >= bandLow && level <= bandHigh).length);
+
+  console.log(`${logPrefix(query)}Reconciling ${mismatched.length} of ${bands.length} level bands: ` +
+    mismatched.map(band => band.join('-')).join(', '));
+
+  const users = [];
+  const seenIds = new Set();
+  for (const band of mismatched) {
+    const bandUsers = await fetchStudentsByKeyset(auth, {
+      ...query,
+      levelRange: band,
+      label: `${query.label ? `${query.label}_` : ''}reconcile_${band.join('-')}`
+    });
+    bandUsers.forEach(user => {
+      if (!seenIds.has(user.id)) {
+        seenIds.add(user.id);
+        users.push(user);
+      }
+    });
+  }
+
+  return users;
+}
+
+async function countStudents(auth, query) {
+  const response = await fetchPage(auth, 1, { ...query, pageSize: 1 });
+  return parseInt(response.headers['x-total'], 10);
+}
 
-  while (hasMorePages) {
+function openCheckpoint(query) {
+  const file = query.label ? CHECKPOINT_FILE.replace(/(\.ndjson)?$/, `_${query.label}$1`) : CHECKPOINT_FILE;
+  const key = JSON.stringify([query.campusId, query.cursusId, query.levelRange, query.filters || {}]);
+  const pages = new Map();
+  let header = null;
+
+  try {
+    const lines = fs.readFileSync(file, 'utf8').split('\n').filter(Boolean);
+    const saved = JSON.parse(lines[0]);
+    if (saved.query === key && Date.now() - Date.parse(saved.createdAt) <= CHECKPOINT_MAX_AGE_MS) {
+      header = saved;
+      for (const line of lines.slice(1)) {
+        try {
+          const entry = JSON.parse(line);
+          pages.set(entry.page, entry.users);
+        } catch (error) {
+          break;
+        }
+      }
+    }
+  } catch (error) {
+    header = null;
+  }
+
+  return {
+    resumed: header !== null,
+    header,
+    pages,
+    start(total, perPage) {
+      pages.clear();
+      fs.writeFileSync(file, `${JSON.stringify({ query: key, total, perPage, createdAt: new Date().toISOString() })}\n`);
+    },
+    record(page, users) {
+      pages.set(page, users);
+      fs.appendFileSync(file, `${JSON.stringify({ page, users })}\n`);
+    },
+    clear() {
+      fs.rmSync(file, { force: true });
+    }
+  };
+}
+
+function createPageSequencer(onPage) {
+  const ready = new Map();
+  let nextPage = 1;
+  let flushing = Promise.resolve();
+
+  return (page, users) => {
+    ready.set(page, users);
+    flushing = flushing.then(async () => {
+      while (ready.has(nextPage)) {
+        const pageUsers = ready.get(nextPage);
+        ready.delete(nextPage);
+        nextPage++;
+        await onPage(pageUsers);
+      }
+    });
+    return flushing;
+  };
+}
+
+function createPrefetchWindow(depth) {
+  const waiting = [];
+  let emitted = 0;
+  let failure = null;
+
+  const wake = () => waiting.splice(0).forEach(resolve => resolve());
+
+  return {
+    async reserve(page) {
+      while (!failure && page > emitted + depth) {
+        await new Promise(resolve => waiting.push(resolve));
+      }
+      if (failure) {
+        throw failure;
+      }
+    },
+    advance() {
+      emitted++;
+      wake();
+    },
+    fail(error) {
+      failure = error;
+      wake();
+    }
+  };
+}
+
+function fetchPage(auth, page, query) {
+  return withRetry(`${logPrefix(query)}Page ${page}`, () => fetchPageOnce(auth, page, query));
+}
+
+async function fetchPageOnce(auth, page, query) {
+  let refreshedToken = false;
+
+  while (true) {
+    const token = await auth.getToken();
+    await concurrency.acquire();
+    await rateLimiter.acquire();
+    const startedAt = Date.now();
     try {
-      console.log(`Fetching page ${page}...`);
+      console.log(`${logPrefix(query)}Fetching page ${page}...`);
 
-      const response = await axios.get(`${BASE_URL}/v2/cursus/${CURSUS_ID}/cursus_users`, {
+      const response = await cachedGet(`/v2/cursus/${query.cursusId}/cursus_users`, {
         headers: {
           Authorization: `Bearer ${token}`
         },
         params: {
-          'filter[campus_id]': CAMPUS_ID,
-          'range[level]': '4,30',
-          'sort': '-level',
-          'page[size]': perPage,
-          'page[number]': page
-        }
+          'filter[campus_id]': query.campusId,
+          'range[level]': query.levelRange.join(','),
+          'sort': query.sort || '-level',
+          'page[size]': query.pageSize || PER_PAGE,
+          'page[number]': page,
+          ...query.filters
+        },
+        transformResponse: parseCursusUsers
       });
-
-      const users = response.data;
-      if (users.length === 0) {
-        hasMorePages = false;
+      concurrency.onSuccess(Date.now() - startedAt);
+      concurrency.release();
+      rateLimiter.sync(response.headers);
+      if (query.pageSize === 1) {
+        metrics.inc('fortytwo_count_probes_total');
       } else {
-        allStudents = allStudents.concat(users);
-        page++;
-        await new Promise(resolve => setTimeout(resolve, 500));
+        metrics.inc('fortytwo_pages_fetched_total');
+        metrics.inc('fortytwo_records_fetched_total', {}, response.data.length);
       }
+      return response;
     } catch (error) {
+      concurrency.release();
       if (error.response) {
-        if (error.response.status === 429) {
-          const retryAfter = error.response.headers['retry-after'] || 5;
+        rateLimiter.sync(error.response.headers);
+        if (error.response.status === 429 || error.response.status >= 500) {
+          concurrency.onThrottle();
+        }
+        if (error.response.status === 401 && !refreshedToken) {
+          console.log('Access token rejected. Requesting a new one...');
+          refreshedToken = true;
+          await auth.refresh(token);
+        } else if (error.response.status === 429) {
+          const retryAfter = Number(error.response.headers['retry-after']) || 5;
           console.log(`Rate limited. Waiting for ${retryAfter} seconds...`);
-          await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+          metrics.inc('fortytwo_rate_limited_total');
+          metrics.inc('fortytwo_retry_after_seconds_total', {}, retryAfter);
+          await sleep(retryAfter * 1000);
         } else {
-          console.error(`API Error: ${error.response.status} - ${JSON.stringify(error.response.data)}`);
+          if (!isRetryable(error)) {
+            console.error(`API Error: ${error.response.status} - ${JSON.stringify(error.response.data)}`);
+          }
           throw error;
         }
       } else {
@@ -104,8 +1534,409 @@ async function fetchAllStudents(token) {
       }
     }
   }
+}
 
-  return allStudents;
+function createApiClient() {
+  const agentOptions = { keepAlive: true, maxSockets: HTTP_MAX_SOCKETS };
+  const sockets = new Set();
+  let closedBytes = 0;
+
+  const trackSocket = socket => {
+    metrics.inc('fortytwo_http_connections_total');
+    sockets.add(socket);
+    socket.once('close', () => {
+      sockets.delete(socket);
+      closedBytes += socket.bytesRead;
+    });
+  };
+  metrics.onCollect(() => {
+    let bytes = closedBytes;
+    sockets.forEach(socket => {
+      bytes += socket.bytesRead;
+    });
+    metrics.set('fortytwo_http_received_bytes_total', {}, bytes);
+  });
+
+  const client = axios.create({
+    baseURL: BASE_URL,
+    timeout: REQUEST_TIMEOUT_MS,
+    httpAgent: countConnections(new http.Agent(agentOptions), trackSocket),
+    httpsAgent: countConnections(new https.Agent(agentOptions), trackSocket),
+    decompress: true,
+    headers: {
+      'Accept-Encoding': 'gzip, deflate, br'
+    }
+  });
+
+  const record = (config, status) => {
+    const endpoint = config.url.replace(/\/\d+(?=\/|$)/g, '/:id');
+    metrics.inc('fortytwo_http_requests_total', { endpoint, status: String(status) });
+    metrics.observe('fortytwo_http_request_duration_seconds', { endpoint }, secondsSince(config.metadata.startedAt));
+  };
+
+  client.interceptors.request.use(config => {
+    config.metadata = { startedAt: performance.now() };
+    return config;
+  });
+  client.interceptors.response.use(
+    response => {
+      record(response.config, response.status);
+      return response;
+    },
+    error => {
+      if (error.config && error.config.metadata) {
+        record(error.config, error.response ? error.response.status : error.code || 'error');
+      }
+      return Promise.reject(error);
+    }
+  );
+
+  return client;
+}
+
+function countConnections(agent, onSocket) {
+  const createConnection = agent.createConnection.bind(agent);
+  agent.createConnection = (...args) => {
+    const socket = createConnection(...args);
+    onSocket(socket);
+    return socket;
+  };
+  return agent;
+}
+
+function createMetrics() {
+  const definitions = {
+    fortytwo_http_requests_total: ['counter', 'Requests sent to the 42 API, by endpoint and status'],
+    fortytwo_http_request_duration_seconds: ['histogram', 'Latency of requests to the 42 API, by endpoint'],
+    fortytwo_http_connections_total: ['counter', 'Connections opened to the 42 API'],
+    fortytwo_http_cache_hits_total: ['counter', 'Requests answered with 304 from the local HTTP cache'],
+    fortytwo_http_received_bytes_total: ['counter', 'Bytes received from the 42 API'],
+    fortytwo_rate_limited_total: ['counter', 'Requests rejected with 429'],
+    fortytwo_retry_after_seconds_total: ['counter', 'Time spent waiting on Retry-After'],
+    fortytwo_pages_fetched_total: ['counter', 'Pages of cursus users fetched'],
+    fortytwo_records_fetched_total: ['counter', 'Cursus users fetched'],
+    fortytwo_count_probes_total: ['counter', 'One-record requests made only to read X-Total'],
+    fortytwo_output_write_seconds_total: ['counter', 'Time spent encoding and writing output files'],
+    fortytwo_export_seconds_total: ['counter', 'Wall time spent running exports']
+  };
+  const series = new Map();
+  const collectors = [];
+
+  const entry = (name, labels) => {
+    const key = `${name}${formatLabels(labels)}`;
+    if (!series.has(key)) {
+      series.set(key, { name, labels, value: 0, sum: 0, count: 0, buckets: LATENCY_BUCKETS_SECONDS.map(() => 0) });
+    }
+    return series.get(key);
+  };
+
+  const select = name => {
+    collectors.forEach(collect => collect());
+    return [...series.values()].filter(item => item.name === name);
+  };
+
+  return {
+    inc(name, labels = {}, value = 1) {
+      entry(name, labels).value += value;
+    },
+    set(name, labels, value) {
+      entry(name, labels).value = value;
+    },
+    observe(name, labels, value) {
+      const item = entry(name, labels);
+      item.sum += value;
+      item.count++;
+      LATENCY_BUCKETS_SECONDS.forEach((bound, index) => {
+        if (value <= bound) {
+          item.buckets[index]++;
+        }
+      });
+    },
+    onCollect(collect) {
+      collectors.push(collect);
+    },
+    select,
+    total(name) {
+      return select(name).reduce((sum, item) => sum + item.value, 0);
+    },
+    render() {
+      const lines = [];
+      Object.entries(definitions).forEach(([name, [type, help]]) => {
+        const items = select(name);
+        lines.push(`# HELP ${name} ${help}`, `# TYPE ${name} ${type}`);
+        if (items.length === 0 && type === 'counter') {
+          lines.push(`${name} 0`);
+        }
+        items.forEach(item => {
+          if (type !== 'histogram') {
+            lines.push(`${name}${formatLabels(item.labels)} ${item.value}`);
+            return;
+          }
+          LATENCY_BUCKETS_SECONDS.forEach((bound, index) => {
+            lines.push(`${name}_bucket${formatLabels({ ...item.labels, le: bound })} ${item.buckets[index]}`);
+          });
+          lines.push(
+            `${name}_bucket${formatLabels({ ...item.labels, le: '+Inf' })} ${item.count}`,
+            `${name}_sum${formatLabels(item.labels)} ${item.sum}`,
+            `${name}_count${formatLabels(item.labels)} ${item.count}`
+          );
+        });
+      });
+      return `${lines.join('\n')}\n`;
+    }
+  };
+}
+
+function formatLabels(labels) {
+  const pairs = Object.entries(labels).map(([name, value]) =>
+    `${name}="${String(value).replace(/[\\"]/g, '\\$&').replace(/\n/g, '\\n')}"`);
+  return pairs.length > 0 ? `{${pairs.join(',')}}` : '';
+}
+
+function secondsSince(startedAt) {
+  return (performance.now() - startedAt) / 1000;
+}
+
+function logMetrics() {
+  const statuses = new Map();
+  metrics.select('fortytwo_http_requests_total').forEach(({ labels, value }) => {
+    statuses.set(labels.status, (statuses.get(labels.status) || 0) + value);
+  });
+  const requests = [...statuses.values()].reduce((sum, value) => sum + value, 0);
+  const connections = metrics.total('fortytwo_http_connections_total');
+  const exportSeconds = metrics.total('fortytwo_export_seconds_total');
+  const pages = metrics.total('fortytwo_pages_fetched_total');
+  const records = metrics.total('fortytwo_records_fetched_total');
+  const perSecond = value => (exportSeconds > 0 ? value / exportSeconds : 0).toFixed(1);
+
+  console.log(`Fetched ${pages} pages (${perSecond(pages)}/s) and ${records} records (${perSecond(records)}/s) ` +
+    `in ${exportSeconds.toFixed(1)}s (plus ${metrics.total('fortytwo_count_probes_total')} count probes), ` +
+    `${(metrics.total('fortytwo_http_received_bytes_total') / 1024 / 1024).toFixed(2)} MB downloaded`);
+  console.log(`HTTP requests: ${requests} (${[...statuses].map(([status, count]) => `${status}: ${count}`).join(', ')}) ` +
+    `over ${connections} connections (${Math.max(0, requests - connections)} reused), ` +
+    `${metrics.total('fortytwo_http_cache_hits_total')} answered from cache`);
+  metrics.select('fortytwo_http_request_duration_seconds').forEach(({ labels, sum, count }) => {
+    console.log(`  ${labels.endpoint}: ${count} requests, ${Math.round((sum / count) * 1000)}ms mean latency`);
+  });
+  console.log(`Rate limited ${metrics.total('fortytwo_rate_limited_total')} times, ` +
+    `${metrics.total('fortytwo_retry_after_seconds_total')}s waiting on Retry-After; ` +
+    `output writes took ${metrics.total('fortytwo_output_write_seconds_total').toFixed(2)}s`);
+}
+
+async function cachedGet(url, config) {
+  const key = crypto.createHash('sha1').update(`${url}?${JSON.stringify(config.params)}`).digest('hex');
+  const file = path.join(HTTP_CACHE_DIR, `${key}.json`);
+  const cached = readCacheEntry(file);
+  const headers = { ...config.headers };
+
+  if (cached && cached.etag) {
+    headers['If-None-Match'] = cached.etag;
+  }
+  if (cached && cached.lastModified) {
+    headers['If-Modified-Since'] = cached.lastModified;
+  }
+
+  let response;
+  if (cached) {
+    revalidatingEntries.add(file);
+  }
+  try {
+    response = await api.get(url, {
+      ...config,
+      headers,
+      validateStatus: status => (status >= 200 && status < 300) || (Boolean(cached) && status === 304)
+    });
+  } finally {
+    revalidatingEntries.delete(file);
+  }
+
+  if (response.status === 304) {
+    metrics.inc('fortytwo_http_cache_hits_total');
+    touchCacheEntry(file, cached);
+    return { ...response, headers: { ...cached.headers, ...response.headers }, data: cached.data };
+  }
+
+  const etag = response.headers.etag;
+  const lastModified = response.headers['last-modified'];
+  if (etag || lastModified) {
+    writeCacheEntry(file, {
+      etag,
+      lastModified,
+      headers: {
+        'x-total': response.headers['x-total'],
+        'x-per-page': response.headers['x-per-page']
+      },
+      data: response.data
+    });
+  }
+
+  return response;
+}
+
+function readCacheEntry(file) {
+  try {
+    return JSON.parse(fs.readFileSync(file, 'utf8'));
+  } catch (error) {
+    return null;
+  }
+}
+
+function touchCacheEntry(file, entry) {
+  const now = new Date();
+  try {
+    fs.utimesSync(file, now, now);
+  } catch (error) {
+    if (error.code !== 'ENOENT') {
+      throw error;
+    }
+    writeCacheEntry(file, entry);
+  }
+}
+
+function writeCacheEntry(file, entry) {
+  fs.mkdirSync(HTTP_CACHE_DIR, { recursive: true });
+  writeFileAtomic(file, JSON.stringify(entry));
+  evictCacheEntries();
+}
+
+function evictCacheEntries() {
+  const entries = fs.readdirSync(HTTP_CACHE_DIR).map(name => {
+    const file = path.join(HTTP_CACHE_DIR, name);
+    const stats = fs.statSync(file);
+    return { file, size: stats.size, usedAt: stats.mtimeMs };
+  });
+  let totalBytes = entries.reduce((sum, entry) => sum + entry.size, 0);
+
+  entries.sort((a, b) => a.usedAt - b.usedAt);
+  for (const entry of entries) {
+    if (totalBytes <= HTTP_CACHE_MAX_BYTES) {
+      break;
+    }
+    if (revalidatingEntries.has(entry.file)) {
+      continue;
+    }
+    fs.rmSync(entry.file, { force: true });
+    totalBytes -= entry.size;
+  }
+}
+
+async function withRetry(description, operation) {
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await operation();
+    } catch (error) {
+      if (!isRetryable(error) || attempt >= RETRY_MAX_ATTEMPTS || retryBudget.remaining <= 0) {
+        throw error;
+      }
+      retryBudget.remaining--;
+      const delay = Math.round(Math.random() *
+        Math.min(RETRY_MAX_DELAY_MS, RETRY_BASE_DELAY_MS * 2 ** attempt));
+      console.log(`${description} failed (${error.response ? error.response.status : error.code}), ` +
+        `retrying in ${delay}ms (attempt ${attempt + 1}/${RETRY_MAX_ATTEMPTS}, ` +
+        `${retryBudget.remaining} retries left this run)...`);
+      await sleep(delay);
+    }
+  }
+}
+
+function isRetryable(error) {
+  if (error.response) {
+    return RETRYABLE_STATUSES.has(error.response.status);
+  }
+  return RETRYABLE_ERROR_CODES.has(error.code);
+}
+
+function createConcurrencyController(initial, max) {
+  const waiting = [];
+  let limit = initial;
+  let inFlight = 0;
+  let baselineLatency = Infinity;
+  let lastDecreaseAt = 0;
+
+  return {
+    async acquire() {
+      while (inFlight >= Math.floor(limit)) {
+        await new Promise(resolve => waiting.push(resolve));
+      }
+      inFlight++;
+    },
+    release() {
+      inFlight--;
+      waiting.splice(0, Math.floor(limit) - inFlight).forEach(resolve => resolve());
+    },
+    onSuccess(latencyMs) {
+      baselineLatency = Math.min(baselineLatency, latencyMs);
+      if (latencyMs <= baselineLatency * LATENCY_TOLERANCE && limit < max) {
+        limit = Math.min(max, limit + 1 / Math.floor(limit));
+      }
+    },
+    onThrottle() {
+      const now = Date.now();
+      if (Number.isFinite(baselineLatency) && now - lastDecreaseAt < baselineLatency * LATENCY_TOLERANCE) {
+        return;
+      }
+      lastDecreaseAt = now;
+      limit = Math.max(1, limit / 2);
+      console.log(`Backing off to ${Math.floor(limit)} concurrent requests`);
+    }
+  };
+}
+
+function createRateLimiter(perSecond, perHour) {
+  const buckets = [
+    createTokenBucket(perSecond, 1000),
+    createTokenBucket(perHour, 60 * 60 * 1000)
+  ];
+  const [, hourly] = buckets;
+  let queue = Promise.resolve();
+
+  const takeToken = async () => {
+    while (true) {
+      const now = Date.now();
+      buckets.forEach(bucket => refillBucket(bucket, now));
+      const wait = Math.max(...buckets.map(bucket =>
+        bucket.tokens >= 1 ? 0 : (1 - bucket.tokens) / bucket.refillPerMs));
+      if (wait === 0) {
+        buckets.forEach(bucket => { bucket.tokens -= 1; });
+        return;
+      }
+      await sleep(Math.ceil(wait));
+    }
+  };
+
+  return {
+    acquire() {
+      const turn = queue.then(takeToken);
+      queue = turn.catch(() => {});
+      return turn;
+    },
+    sync(headers = {}) {
+      const remaining = parseInt(headers['x-hourly-ratelimit-remaining'], 10);
+      if (!Number.isNaN(remaining)) {
+        refillBucket(hourly, Date.now());
+        hourly.tokens = Math.min(hourly.tokens, remaining);
+      }
+    }
+  };
+}
+
+function createTokenBucket(capacity, intervalMs) {
+  return {
+    capacity,
+    tokens: capacity,
+    refillPerMs: capacity / intervalMs,
+    updatedAt: Date.now()
+  };
+}
+
+function refillBucket(bucket, now) {
+  bucket.tokens = Math.min(bucket.capacity,
+    bucket.tokens + (now - bucket.updatedAt) * bucket.refillPerMs);
+  bucket.updatedAt = now;
+}
+
+function sleep(ms) {
+  return new Promise(resolve => setTimeout(resolve, ms));
 }
 
 main();